@@ -1,27 +1,30 @@
 """Pipeline command - full ETL pipeline."""
 import asyncio
+import logging
 from datetime import datetime
 from typing import Optional
 
 from rich.console import Console
 
-from ..config import get_config
+from ..config import AppConfig, get_config
 from ..downloaders.web_downloader import WebDownloader
 from ..processors.parquet_ingestor import ParquetIngestor
 from ..processors.integrity_tester import IntegrityTester
 
 console = Console()
+logger = logging.getLogger(__name__)
 
 
 class PipelineCommand:
     """Execute the full ETL pipeline."""
     
-    def __init__(self, month: Optional[str] = None):
+    def __init__(self, month: Optional[str] = None, config: Optional[AppConfig] = None):
         self.month = month or datetime.now().strftime("%Y-%m")
+        self.config = config or get_config()
     
     async def execute_async(self) -> int:
         """Execute the pipeline."""
-        config = get_config()
+        config = self.config
         
         try:
             console.print(f"[cyan]1/6 Baixando dados de {self.month}...[/]")
@@ -50,5 +53,5 @@ class PipelineCommand:
         
         except Exception as ex:
             console.print(f"[red]❌ Erro no pipeline: {ex}[/]")
-            console.print_exception()
+            logger.exception("Erro no pipeline")
             return 1
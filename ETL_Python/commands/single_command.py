@@ -1,24 +1,29 @@
 """Single CNPJ command - process a specific CNPJ."""
+import logging
+from typing import Optional
+
 from rich.console import Console
 
-from ..config import get_config
+from ..config import AppConfig, get_config
 from ..processors.parquet_ingestor import ParquetIngestor
 from ..utils.cnpj_utils import CnpjUtils
 
 console = Console()
+logger = logging.getLogger(__name__)
 
 
 class SingleCommand:
     """Process a single CNPJ."""
     
-    def __init__(self, cnpj: str):
+    def __init__(self, cnpj: str, config: Optional[AppConfig] = None):
         if not CnpjUtils.is_valid_format(cnpj):
             raise ValueError("CNPJ inválido. Informe um CNPJ com 14 dígitos.")
         self.cnpj = cnpj
+        self.config = config or get_config()
     
     async def execute_async(self) -> int:
         """Execute the single CNPJ command."""
-        config = get_config()
+        config = self.config
         
         try:
             with ParquetIngestor() as ingestor:
@@ -29,5 +34,5 @@ class SingleCommand:
         
         except Exception as ex:
             console.print(f"[red]❌ Erro ao processar CNPJ: {ex}[/]")
-            console.print_exception()
+            logger.exception("Erro ao processar CNPJ")
             return 1
@@ -1,9 +1,12 @@
 """Test command - run integrity tests."""
+import logging
+
 from rich.console import Console
 
 from ..processors.integrity_tester import IntegrityTester
 
 console = Console()
+logger = logging.getLogger(__name__)
 
 
 class TestCommand:
@@ -20,5 +23,5 @@ class TestCommand:
         
         except Exception as ex:
             console.print(f"[red]❌ Erro no teste: {ex}[/]")
-            console.print_exception()
+            logger.exception("Erro no teste de integridade")
             return 1
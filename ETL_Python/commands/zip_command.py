@@ -1,9 +1,12 @@
 """ZIP command - export all data to ZIP."""
+import logging
+
 from rich.console import Console
 
 from ..processors.parquet_ingestor import ParquetIngestor
 
 console = Console()
+logger = logging.getLogger(__name__)
 
 
 class ZipCommand:
@@ -20,5 +23,5 @@ class ZipCommand:
         
         except Exception as ex:
             console.print(f"[red]❌ Erro ao gerar ZIP: {ex}[/]")
-            console.print_exception()
+            logger.exception("Erro ao gerar ZIP")
             return 1
@@ -1,11 +1,14 @@
-import json
+import functools
 import os
-from dataclasses import dataclass
-from pathlib import Path
-from typing import Optional
+from dataclasses import dataclass, fields
+from typing import Any, Dict, Optional, Tuple, Type, TypeVar
 
+from .utils import json_io
 
-@dataclass
+_T = TypeVar("_T")
+
+
+@dataclass(frozen=True, slots=True)
 class PathsConfig:
     data_dir: str = "./extracted_data"
     parquet_dir: str = "./parquet_data"
@@ -14,23 +17,23 @@ class PathsConfig:
     hash_cache_dir: str = "./hash_cache"
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class RcloneSettings:
     remote_base: str = ""
     transfers: int = 100
     max_concurrent_uploads: int = 4
+    s3_tuning: bool = False
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class DuckDbSettings:
     use_in_memory: bool = True
-    threads_pragma: int = 2
     memory_limit: str = "5GB"
     engine_threads: int = 2
     preserve_insertion_order: bool = False
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class NdjsonSettings:
     batch_upload_size: int = 10000
     normalize_before_hash: bool = False
@@ -38,12 +41,12 @@ class NdjsonSettings:
     max_parallel_processing: int = 8
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class DownloaderSettings:
     parallel_downloads: int = 6
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class AppConfig:
     paths: PathsConfig
     rclone: RcloneSettings
@@ -58,30 +61,20 @@ class AppConfig:
         
         try:
             if os.path.exists(config_path):
-                with open(config_path, "r", encoding="utf-8") as f:
-                    data = json.load(f)
+                with open(config_path, "rb") as f:
+                    data = json_io.loads(f.read())
+                if not isinstance(data, dict):
+                    raise TypeError("config.json must be an object")
                 
                 return cls(
-                    paths=PathsConfig(**{k.lower().replace("dir", "_dir"): v for k, v in data.get("Paths", {}).items()}),
-                    rclone=RcloneSettings(**{k.lower().replace("base", "_base"): v for k, v in data.get("Rclone", {}).items()}),
-                    duckdb=DuckDbSettings(**{
-                        "use_in_memory": data.get("DuckDb", {}).get("UseInMemory", True),
-                        "threads_pragma": data.get("DuckDb", {}).get("ThreadsPragma", 2),
-                        "memory_limit": data.get("DuckDb", {}).get("MemoryLimit", "5GB"),
-                        "engine_threads": data.get("DuckDb", {}).get("EngineThreads", 2),
-                        "preserve_insertion_order": data.get("DuckDb", {}).get("PreserveInsertionOrder", False),
-                    }),
-                    ndjson=NdjsonSettings(**{
-                        "batch_upload_size": data.get("Ndjson", {}).get("BatchUploadSize", 10000),
-                        "normalize_before_hash": data.get("Ndjson", {}).get("NormalizeBeforeHash", False),
-                        "write_json_files": data.get("Ndjson", {}).get("WriteJsonFiles", False),
-                        "max_parallel_processing": data.get("Ndjson", {}).get("MaxParallelProcessing", 8),
-                    }),
-                    downloader=DownloaderSettings(**{
-                        "parallel_downloads": data.get("Downloader", {}).get("ParallelDownloads", 6)
-                    })
+                    paths=_section(PathsConfig, data, "Paths"),
+                    rclone=_section(RcloneSettings, data, "Rclone"),
+                    duckdb=_section(DuckDbSettings, data, "DuckDb"),
+                    ndjson=_section(NdjsonSettings, data, "Ndjson"),
+                    downloader=_section(DownloaderSettings, data, "Downloader")
                 )
-        except Exception:
+        except (OSError, ValueError, TypeError):
+            # ValueError covers malformed JSON; TypeError a mistyped section or value
             pass
         
         # Return default config if loading fails
@@ -94,6 +87,37 @@ class AppConfig:
         )
 
 
+@functools.cache
+def _json_keys(cls: type) -> Tuple[Tuple[str, str, type], ...]:
+    """Map each dataclass field to its CamelCase key in config.json and its type."""
+    return tuple(
+        ("".join(part.capitalize() for part in f.name.split("_")), f.name, f.type)
+        for f in fields(cls)
+    )
+
+
+def _section(cls: Type[_T], data: Dict[str, Any], key: str) -> _T:
+    """Build a settings dataclass from a config.json section, ignoring unknown keys.
+    
+    Raises TypeError when the section or one of its values has the wrong type.
+    """
+    section = data.get(key) or {}
+    if not isinstance(section, dict):
+        raise TypeError(f"{key} must be an object")
+    
+    values = {}
+    for json_key, field_name, field_type in _json_keys(cls):
+        if json_key not in section:
+            continue
+        value = section[json_key]
+        # Exact type: a bool is not accepted for an int setting
+        if type(value) is not field_type:
+            raise TypeError(f"{key}.{json_key} must be {field_type.__name__}")
+        values[field_name] = value
+    
+    return cls(**values)
+
+
 # Global config instance
 _current_config: Optional[AppConfig] = None
 
@@ -1,6 +1,11 @@
 import asyncio
+import contextlib
+import html
 import os
 import re
+import ssl
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from typing import List
 from zipfile import ZipFile
@@ -17,14 +22,78 @@ from rich.progress import (
     TaskID,
 )
 
+from ..config import get_config
+
+try:
+    import libarchive
+except (ImportError, OSError, AttributeError):  # optional; needs the libarchive C library
+    libarchive = None
+
 console = Console()
 
+# Built once and shared by every connection; creating a context per session
+# reloads the CA bundle each time.
+_SSL_CONTEXT = ssl.create_default_context()
+
+# Sent with every request; the listing page compresses well and aiohttp decompresses it
+_REQUEST_HEADERS = {"Accept-Encoding": "gzip, deflate", "User-Agent": "OpenCNPJ/1.0"}
+_LISTING_TIMEOUT = aiohttp.ClientTimeout(total=300)
+
+_DOWNLOAD_CHUNK_SIZE = 1 << 20  # 1 MiB
+_PROGRESS_INTERVAL = 0.2  # seconds between progress redraws per download
+
+
+# href values ending in .zip (any case), double-, single- or un-quoted
+_ZIP_HREF_RE = re.compile(
+    r"""\bhref\s*=\s*(?:"\s*([^"]*?\.zip)\s*"|'\s*([^']*?\.zip)\s*'|([^\s"'>]*?\.zip)(?=[\s>]))""",
+    re.IGNORECASE
+)
+
+
+def _parse_zip_hrefs(page: str) -> List[str]:
+    """Return the ZIP hrefs of an HTML listing in document order."""
+    return [
+        html.unescape(href) if "&" in href else href
+        for href in (double or single or bare for double, single, bare in _ZIP_HREF_RE.findall(page))
+    ]
+
+
+def _extract_one(zip_path: str, target_dir: str) -> None:
+    """Extract a single ZIP file (runs in a worker process).
+    
+    Uses libarchive when available (C-level streaming with large buffers),
+    otherwise zipfile.
+    """
+    if libarchive is None:
+        with ZipFile(zip_path, "r") as zip_ref:
+            zip_ref.extractall(target_dir)
+        return
+    
+    # libarchive extracts into the current directory (refusing paths that escape it)
+    zip_path = os.path.abspath(zip_path)
+    previous_cwd = os.getcwd()
+    os.chdir(target_dir)
+    try:
+        libarchive.extract_file(zip_path)
+    finally:
+        os.chdir(previous_cwd)
+
 
 class WebDownloader:
     """Download and extract CNPJ data files from Receita Federal."""
     
     BASE_URL = "https://arquivos.receitafederal.gov.br/dados/cnpj/dados_abertos_cnpj/"
     
+    # Last path segment of a URL, ignoring query string and fragment
+    _NAME_RE = re.compile(r"/([^/?#]+)(?:[?#]|$)")
+    
+    # Name fragments of the CSVs shipped inside the Receita Federal ZIPs
+    _EXTRACTED_MARKERS = (
+        "EMPRECSV", "ESTABELE", "SOCIOCSV", "SIMPLES",
+        "CNAECSV", "MOTICSV", "MUNICCSV", "NATJUCSV",
+        "PAISCSV", "QUALSCSV"
+    )
+    
     def __init__(self, download_dir: str, extract_dir: str):
         self._download_dir = download_dir
         self._extract_dir = extract_dir
@@ -36,29 +105,38 @@ class WebDownloader:
         page_url = f"{self.BASE_URL}{year_month.strip('/')}/"
         console.print(f"[blue]Acessando:[/] [white]{page_url}[/]")
         
-        zip_urls = await self._list_zip_urls_async(page_url)
-        if not zip_urls:
-            console.print("[yellow]Nenhum arquivo ZIP encontrado nessa página.[/]")
-            return
+        config = get_config()
+        parallel_downloads = max(1, config.downloader.parallel_downloads)
+        
+        # One session for the listing and every download so connections (and TLS) are reused
+        connector = aiohttp.TCPConnector(limit=parallel_downloads, ssl=_SSL_CONTEXT)
+        timeout = aiohttp.ClientTimeout(total=None)
+        async with aiohttp.ClientSession(
+            connector=connector,
+            timeout=timeout,
+            headers=_REQUEST_HEADERS,
+            auto_decompress=True
+        ) as session:
+            zip_urls = await self._list_zip_urls_async(session, page_url)
+            if not zip_urls:
+                console.print("[yellow]Nenhum arquivo ZIP encontrado nessa página.[/]")
+                return
+            
+            local_zips = await self._download_all_async(session, zip_urls, parallel_downloads)
         
-        local_zips = await self._download_all_async(zip_urls)
         await self._extract_all_async(local_zips, self._extract_dir)
     
-    async def _list_zip_urls_async(self, page_url: str) -> List[str]:
+    async def _list_zip_urls_async(self, session: aiohttp.ClientSession, page_url: str) -> List[str]:
         """List all ZIP URLs from the page."""
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(page_url, headers={"User-Agent": "OpenCNPJ/1.0"}) as resp:
-                    resp.raise_for_status()
-                    html = await resp.text()
+            async with session.get(page_url, timeout=_LISTING_TIMEOUT) as resp:
+                resp.raise_for_status()
+                page = await resp.text()
+            
+            hrefs = _parse_zip_hrefs(page)
             
             urls = []
-            pattern = re.compile(r'href="([^"]+?\.zip)"', re.IGNORECASE)
-            for match in pattern.finditer(html):
-                href = match.group(1)
-                if not href.strip():
-                    continue
-                
+            for href in hrefs:
                 if href.lower().startswith("http"):
                     url = href
                 else:
@@ -74,22 +152,31 @@ class WebDownloader:
             console.print(f"[red]Erro ao obter lista de arquivos: {ex}[/]")
             return []
     
-    async def _download_all_async(self, urls: List[str]) -> List[str]:
+    async def _download_all_async(
+        self,
+        session: aiohttp.ClientSession,
+        urls: List[str],
+        parallel_downloads: int
+    ) -> List[str]:
         """Download all files with progress tracking."""
-        from ..config import get_config
-        config = get_config()
-        
         results = []
-        files_info = []
+        to_download = []
+        
+        # One directory listing instead of an exists() call per file
+        present = {entry.name for entry in os.scandir(self._download_dir) if entry.is_file()}
         
         for url in urls:
-            filename = os.path.basename(url.split("?")[0])
+            match = self._NAME_RE.search(url)
+            filename = match.group(1) if match else os.path.basename(url.split("?")[0])
             filepath = os.path.join(self._download_dir, filename)
-            files_info.append({
-                "url": url,
-                "filename": filename,
-                "filepath": filepath
-            })
+            if filename in present:
+                results.append(filepath)
+            else:
+                to_download.append({
+                    "url": url,
+                    "filename": filename,
+                    "filepath": filepath
+                })
         
         with Progress(
             TextColumn("[progress.description]{task.description}"),
@@ -98,44 +185,46 @@ class WebDownloader:
             TimeRemainingColumn(),
             SpinnerColumn(),
         ) as progress:
-            tasks = {}
+            if results:
+                progress.add_task(
+                    f"[green]✓ {len(results)} arquivo(s) já existem[/]",
+                    total=1,
+                    completed=1
+                )
             
-            # Mark already downloaded files
-            for info in files_info:
-                if os.path.exists(info["filepath"]):
-                    task_id = progress.add_task(
-                        f"[green]✓ {info['filename']} (já existe)[/]",
-                        total=1,
-                        completed=1
-                    )
-                    results.append(info["filepath"])
-                else:
-                    task_id = progress.add_task(f"[cyan]{info['filename']}[/]", total=None)
-                    tasks[info["filepath"]] = task_id
+            tasks = {
+                info["filepath"]: progress.add_task(f"[cyan]{info['filename']}[/]", total=None)
+                for info in to_download
+            }
             
             # Download files in parallel
-            to_download = [info for info in files_info if not os.path.exists(info["filepath"])]
-            
-            parallel_downloads = max(1, config.downloader.parallel_downloads)
             sem = asyncio.Semaphore(parallel_downloads)
             
-            async def download_with_sem(info):
-                async with sem:
+            async def download_then_release(info):
+                try:
                     task_id = tasks[info["filepath"]]
                     local_path = await self._download_one_async(
+                        session,
                         info["url"],
                         info["filepath"],
                         progress,
                         task_id
                     )
                     results.append(local_path)
+                finally:
+                    sem.release()
             
-            await asyncio.gather(*[download_with_sem(info) for info in to_download])
+            # Only parallel_downloads tasks exist at a time; a failure cancels the rest
+            async with asyncio.TaskGroup() as tg:
+                for info in to_download:
+                    await sem.acquire()
+                    tg.create_task(download_then_release(info))
         
         return results
     
     async def _download_one_async(
         self,
+        session: aiohttp.ClientSession,
         url: str,
         filepath: str,
         progress: Progress,
@@ -148,37 +237,71 @@ class WebDownloader:
         if not filepath.startswith(os.path.abspath(self._download_dir)):
             raise ValueError(f"Invalid filepath: {filepath}")
         
+        # Streamed under a temporary name: only a finished download gets the
+        # final name, which is what the "already downloaded" check looks for
+        part_path = filepath + ".part"
         retry = 0
         
         while True:
             try:
-                timeout = aiohttp.ClientTimeout(total=None)
-                async with aiohttp.ClientSession(timeout=timeout) as session:
-                    async with session.get(url, headers={"User-Agent": "OpenCNPJ/1.0"}) as resp:
-                        resp.raise_for_status()
-                        
-                        total = resp.content_length or 0
-                        if total > 0:
-                            progress.update(task_id, total=total)
-                        else:
-                            progress.update(task_id, total=1_000_000)  # Fallback
+                async with session.get(url) as resp:
+                    resp.raise_for_status()
+                    
+                    total = resp.content_length or 0
+                    if total > 0:
+                        progress.update(task_id, total=total)
+                    else:
+                        progress.update(task_id, total=1_000_000)  # Fallback
+                    
+                    with open(part_path, "wb") as f:
+                        if total > 0 and hasattr(os, "posix_fallocate"):
+                            # Reserve the whole file up front to avoid extent fragmentation
+                            with contextlib.suppress(OSError):
+                                os.posix_fallocate(f.fileno(), 0, total)
                         
-                        with open(filepath, "wb") as f:
-                            read_total = 0
-                            async for chunk in resp.content.iter_chunked(65536):
-                                f.write(chunk)
-                                read_total += len(chunk)
-                                if total > 0:
-                                    progress.update(task_id, completed=read_total)
-                                else:
-                                    progress.update(task_id, advance=len(chunk))
+                        read_total = 0
+                        last_update = time.monotonic()
+                        async for chunk in resp.content.iter_chunked(_DOWNLOAD_CHUNK_SIZE):
+                            # Disk writes run in a thread so they don't stall the event loop
+                            await asyncio.to_thread(f.write, chunk)
+                            read_total += len(chunk)
+                            
+                            now = time.monotonic()
+                            if now - last_update >= _PROGRESS_INTERVAL:
+                                progress.update(task_id, completed=read_total)
+                                last_update = now
                         
-                        progress.update(
-                            task_id,
-                            description=f"[green]✓ {os.path.basename(filepath)}[/]",
-                            completed=total if total > 0 else read_total
-                        )
-                        return filepath
+                        if total > 0 and read_total != total:
+                            # With a Content-Encoding the length counts compressed bytes:
+                            # only drop the space preallocated for them
+                            if "Content-Encoding" in resp.headers:
+                                f.truncate(read_total)
+                            else:
+                                # A connection closed early must not become a "complete"
+                                # ZIP; the .part file is dropped and the download retried
+                                raise aiohttp.ClientPayloadError(
+                                    f"Download incompleto: {read_total} de {total} bytes"
+                                )
+                    
+                    os.replace(part_path, filepath)
+                    
+                    if hasattr(os, "posix_fadvise"):
+                        # The ZIP is only read again at extraction; don't keep it in page cache
+                        with open(filepath, "rb") as f, contextlib.suppress(OSError):
+                            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+                    
+                    progress.update(
+                        task_id,
+                        description=f"[green]✓ {os.path.basename(filepath)}[/]",
+                        completed=total if total > 0 else read_total
+                    )
+                    return filepath
+            
+            except asyncio.CancelledError:
+                # Cancelled by the TaskGroup after another download failed
+                with contextlib.suppress(OSError):
+                    os.remove(part_path)
+                raise
             
             except Exception:
                 retry += 1
@@ -187,47 +310,58 @@ class WebDownloader:
                     description=f"[red]✗ {os.path.basename(filepath)} (tentativa {retry})[/]"
                 )
                 if retry >= max_retries:
+                    with contextlib.suppress(OSError):
+                        os.remove(part_path)
                     raise
                 await asyncio.sleep(1 * retry)
         
         raise RuntimeError("Falha no download após múltiplas tentativas")
     
+    @classmethod
+    def _has_extracted_files(cls, target_dir: str) -> bool:
+        """Walk target_dir once and stop at the first extracted CSV found."""
+        for _, dirnames, filenames in os.walk(target_dir):
+            for name in filenames + dirnames:
+                if any(marker in name for marker in cls._EXTRACTED_MARKERS):
+                    return True
+        return False
+    
     async def _extract_all_async(self, zip_files: List[str], target_dir: str) -> None:
         """Extract all ZIP files to the target directory."""
         Path(target_dir).mkdir(parents=True, exist_ok=True)
         
         # Check if files are already extracted
-        extracted_patterns = [
-            "*EMPRECSV*", "*ESTABELE*", "*SOCIOCSV*", "*SIMPLES*",
-            "*CNAECSV*", "*MOTICSV*", "*MUNICCSV*", "*NATJUCSV*",
-            "*PAISCSV*", "*QUALSCSV*"
-        ]
-        
-        has_extracted = any(
-            list(Path(target_dir).rglob(pattern))
-            for pattern in extracted_patterns
-        )
+        has_extracted = self._has_extracted_files(target_dir)
         
         if has_extracted:
             console.print("[blue]ℹ️ Arquivos já extraídos encontrados; pulando extração.[/]")
             return
         
+        if not zip_files:
+            return
+        
+        loop = asyncio.get_running_loop()
+        max_workers = min(len(zip_files), os.cpu_count() or 1)
+        
         with Progress(
             TextColumn("[progress.description]{task.description}"),
             BarColumn(),
-        ) as progress:
-            for zip_path in zip_files:
+        ) as progress, ProcessPoolExecutor(max_workers=max_workers) as pool:
+            
+            async def extract_with_progress(zip_path: str):
                 filename = os.path.basename(zip_path)
                 task_id = progress.add_task(f"[yellow]Extraindo {filename}[/]", total=1)
                 
                 try:
-                    with ZipFile(zip_path, "r") as zip_ref:
-                        zip_ref.extractall(target_dir)
+                    # DEFLATE is CPU-bound; each archive is decompressed in its own process
+                    await loop.run_in_executor(pool, _extract_one, zip_path, target_dir)
                     progress.update(task_id, completed=1)
                 except Exception as ex:
                     progress.update(
                         task_id,
                         description=f"[red]Erro em {filename}: {ex}[/]"
                     )
+            
+            await asyncio.gather(*[extract_with_progress(zip_path) for zip_path in zip_files])
         
         console.print(f"[green]✓ Extração concluída em {os.path.abspath(target_dir)}[/]")
@@ -1,11 +1,20 @@
 import asyncio
+import atexit
+import contextlib
 import os
 import re
-from typing import Optional
+import secrets
+import signal
+import socket
+import tempfile
+from typing import List, Optional, Tuple
 
+import aiohttp
 from rich.console import Console
 from rich.progress import Progress, TaskID
 
+from ..config import AppConfig, get_config
+
 console = Console()
 
 
@@ -15,26 +24,51 @@ class RcloneClient:
     _upload_semaphore: Optional[asyncio.Semaphore] = None
     _transfer_regex = re.compile(r"Transferred:\s+\d+\s*/\s*\d+,\s*(\d+)%", re.IGNORECASE)
     
+    # Split each large file into parallel multipart uploads (S3/R2/B2 remotes only)
+    S3_TUNING_ARGS = (
+        "--multi-thread-streams=8", "--multi-thread-cutoff=64M",
+        "--s3-upload-concurrency=16", "--s3-chunk-size=64M"
+    )
+    
+    # Long-running `rclone rcd` shared by single-file copies (see _rc_copyfile_async)
+    _daemon_process: Optional[asyncio.subprocess.Process] = None
+    _daemon_url: Optional[str] = None
+    _daemon_session: Optional[aiohttp.ClientSession] = None
+    _daemon_unavailable: bool = False
+    _daemon_lock: Optional[asyncio.Lock] = None
+    DAEMON_STARTUP_TIMEOUT: float = 15.0
+    # The free port is picked before rcd binds it, so another process can take
+    # it in between; rcd then exits at startup and is relaunched on a new port
+    DAEMON_START_ATTEMPTS: int = 3
+    
+    # (config, remote_base, transfers) resolved from the config object it was read from
+    _resolved: Optional[Tuple[AppConfig, str, int]] = None
+    
+    @classmethod
+    def _resolve_settings(cls) -> Tuple[str, int]:
+        """Resolve remote base and transfers once per config instance."""
+        config = get_config()
+        resolved = cls._resolved
+        if resolved is None or resolved[0] is not config:
+            remote = os.environ.get("RCLONE_REMOTE", config.rclone.remote_base).rstrip("/")
+            resolved = (config, remote, max(1, config.rclone.transfers))
+            cls._resolved = resolved
+        return resolved[1], resolved[2]
+    
     @classmethod
     def _get_remote_base(cls) -> str:
         """Get the rclone remote base path."""
-        from ..config import get_config
-        config = get_config()
-        remote = os.environ.get("RCLONE_REMOTE", config.rclone.remote_base)
-        return remote.rstrip("/")
+        return cls._resolve_settings()[0]
     
     @classmethod
     def _get_transfers(cls) -> int:
         """Get the number of transfers."""
-        from ..config import get_config
-        config = get_config()
-        return max(1, config.rclone.transfers)
+        return cls._resolve_settings()[1]
     
     @classmethod
     def _get_upload_semaphore(cls) -> asyncio.Semaphore:
         """Get or create the upload semaphore."""
         if cls._upload_semaphore is None:
-            from ..config import get_config
             config = get_config()
             cls._upload_semaphore = asyncio.Semaphore(config.rclone.max_concurrent_uploads)
         return cls._upload_semaphore
@@ -62,6 +96,8 @@ class RcloneClient:
                     "--bwlimit=off",
                     "--retries=-1", "--retries-sleep=60s", "--low-level-retries=10"
                 ]
+                if get_config().rclone.s3_tuning:
+                    args.extend(cls.S3_TUNING_ARGS)
                 
                 process = await asyncio.create_subprocess_exec(
                     *args,
@@ -74,13 +110,21 @@ class RcloneClient:
                 async def read_output():
                     """Read stdout for progress updates."""
                     if process.stdout:
+                        last_percentage = -1
                         async for line in process.stdout:
+                            # Most stats lines are not the transfer counter; skip them
+                            # before paying for a decode and a regex search.
+                            if b"Transferred:" not in line:
+                                continue
                             try:
                                 line_str = line.decode("utf-8", errors="ignore")
                                 match = cls._transfer_regex.search(line_str)
                                 if match and progress_task:
-                                    progress, task_id = progress_task
                                     percentage = int(match.group(1))
+                                    if percentage == last_percentage:
+                                        continue
+                                    last_percentage = percentage
+                                    progress, task_id = progress_task
                                     progress.update(
                                         task_id,
                                         completed=percentage,
@@ -93,20 +137,18 @@ class RcloneClient:
                     """Read stderr for errors."""
                     if process.stderr:
                         async for line in process.stderr:
-                            try:
-                                line_str = line.decode("utf-8", errors="ignore")
-                                error_buffer.append(line_str)
-                                if "ERROR" in line_str.upper():
-                                    console.print(f"[red]rclone: {line_str.strip()}[/]")
-                            except Exception:
-                                pass
+                            # Keep raw bytes; only lines reporting an error are decoded now
+                            error_buffer.append(line)
+                            if b"ERROR" in line.upper():
+                                console.print(f"[red]rclone: {line.decode('utf-8', errors='ignore').strip()}[/]")
                 
                 await asyncio.gather(read_output(), read_errors())
                 await process.wait()
                 
                 ok = process.returncode == 0
                 if not ok and error_buffer:
-                    console.print(f"[red]Erro no rclone upload: {''.join(error_buffer)}[/]")
+                    errors = b"".join(error_buffer).decode("utf-8", errors="ignore")
+                    console.print(f"[red]Erro no rclone upload: {errors}[/]")
                 
                 return ok
             
@@ -114,33 +156,211 @@ class RcloneClient:
                 console.print(f"[red]Erro no rclone upload: {ex}[/]")
                 return False
     
+    @classmethod
+    async def _ensure_daemon_async(cls) -> Optional[str]:
+        """Start the shared `rclone rcd` daemon on first use and return its URL."""
+        if cls._daemon_url is not None:
+            return cls._daemon_url
+        if cls._daemon_unavailable:
+            return None
+        
+        if cls._daemon_lock is None:
+            cls._daemon_lock = asyncio.Lock()
+        
+        async with cls._daemon_lock:
+            if cls._daemon_url is not None or cls._daemon_unavailable:
+                return cls._daemon_url
+            
+            # The RC API can run any rclone command with the remote's credentials,
+            # so every launch gets fresh random credentials. One session carries
+            # them on every RC call and is closed by close_async
+            auth = aiohttp.BasicAuth(secrets.token_urlsafe(16), secrets.token_urlsafe(32))
+            cls._daemon_session = aiohttp.ClientSession(auth=auth)
+            atexit.register(cls._terminate_daemon)
+            
+            try:
+                for _ in range(cls.DAEMON_START_ATTEMPTS):
+                    cls._daemon_url = await cls._start_daemon_async(cls._daemon_session, auth)
+                    if cls._daemon_url is not None:
+                        break
+                    await cls._stop_daemon_async()
+                else:
+                    raise RuntimeError("rclone rcd encerrou durante a inicialização")
+            
+            except Exception as ex:
+                console.print(f"[yellow]⚠️ rclone rcd indisponível, usando processos avulsos: {ex}[/]")
+                await cls._stop_daemon_async()
+                await cls._daemon_session.close()
+                cls._daemon_session = None
+                cls._daemon_unavailable = True
+            
+            return cls._daemon_url
+    
+    @classmethod
+    async def _start_daemon_async(cls, session: aiohttp.ClientSession, auth: aiohttp.BasicAuth) -> Optional[str]:
+        """Launch `rclone rcd` on a free local port and wait for its RC API.
+        
+        Returns None if the process exits during startup (e.g. the port was
+        taken before rcd could bind it).
+        """
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        url = f"http://127.0.0.1:{port}/"
+        
+        # Credentials go through the environment, not argv, so they don't show up in `ps`
+        env = dict(os.environ, RCLONE_RC_USER=auth.login, RCLONE_RC_PASS=auth.password)
+        cls._daemon_process = await asyncio.create_subprocess_exec(
+            "rclone", "rcd", f"--rc-addr=127.0.0.1:{port}",
+            "--low-level-retries=10", "--bwlimit=off", "--no-update-modtime",
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.DEVNULL,
+            env=env
+        )
+        
+        # Wait until the RC API answers
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + cls.DAEMON_STARTUP_TIMEOUT
+        while True:
+            if cls._daemon_process.returncode is not None:
+                return None
+            try:
+                async with session.post(url + "rc/noop", json={}) as resp:
+                    if resp.status == 200:
+                        return url
+            except aiohttp.ClientError:
+                pass
+            if loop.time() > deadline:
+                raise RuntimeError("rclone rcd não respondeu a tempo")
+            await asyncio.sleep(0.1)
+    
+    @classmethod
+    async def close_async(cls) -> None:
+        """Stop the shared `rclone rcd` daemon and close its HTTP session."""
+        await cls._stop_daemon_async()
+        if cls._daemon_session is not None:
+            await cls._daemon_session.close()
+            cls._daemon_session = None
+    
+    @classmethod
+    async def _stop_daemon_async(cls) -> None:
+        """Terminate the shared `rclone rcd` daemon, if running."""
+        process = cls._daemon_process
+        cls._daemon_process = None
+        cls._daemon_url = None
+        if process is None or process.returncode is not None:
+            return
+        
+        with contextlib.suppress(ProcessLookupError):
+            process.terminate()
+            try:
+                await asyncio.wait_for(process.wait(), 5)
+            except asyncio.TimeoutError:
+                process.kill()
+                await process.wait()
+    
+    @classmethod
+    def _terminate_daemon(cls) -> None:
+        """Signal the daemon at interpreter exit, if close_async did not run.
+        
+        The event loop is gone by then, so the process is signalled by pid.
+        """
+        process = cls._daemon_process
+        cls._daemon_process = None
+        if process is not None and process.returncode is None:
+            with contextlib.suppress(ProcessLookupError):
+                os.kill(process.pid, signal.SIGTERM)
+    
+    @staticmethod
+    def _split_remote_path(path: str) -> Tuple[str, str]:
+        """Split a path into (fs, relative) as expected by the RC API."""
+        if "/" in path:
+            fs, _, relative = path.rpartition("/")
+            return fs or "/", relative
+        if ":" in path:
+            fs, _, relative = path.partition(":")
+            return fs + ":", relative
+        return ".", path
+    
+    @classmethod
+    async def _rc_copyfile_async(cls, src_path: str, dst_path: str) -> Optional[Tuple[bool, str]]:
+        """Copy one file through the shared daemon.
+        
+        Returns None when the daemon is unavailable. Callers fall back to a
+        one-shot `rclone copyto` process (which retries indefinitely) in that
+        case and when the daemon reports a failure.
+        """
+        url = await cls._ensure_daemon_async()
+        if url is None:
+            return None
+        
+        src_fs, src_remote = cls._split_remote_path(src_path)
+        dst_fs, dst_remote = cls._split_remote_path(dst_path)
+        params = {
+            "srcFs": src_fs,
+            "srcRemote": src_remote,
+            "dstFs": dst_fs,
+            "dstRemote": dst_remote,
+        }
+        
+        try:
+            async with cls._daemon_session.post(url + "operations/copyfile", json=params) as resp:
+                if resp.status == 200:
+                    return True, ""
+                return False, await resp.text()
+        except aiohttp.ClientError as ex:
+            return False, str(ex)
+    
+    @classmethod
+    async def _copyto_process_async(cls, src_path: str, dst_path: str, extra_args: list) -> Tuple[bool, str]:
+        """Copy one file by spawning a one-shot `rclone copyto` process."""
+        args = [
+            "rclone", "copyto", src_path, dst_path,
+            "--retries=-1", "--retries-sleep=60s", "--low-level-retries=10",
+            "--bwlimit=off", *extra_args
+        ]
+        
+        process = await asyncio.create_subprocess_exec(
+            *args,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        
+        _, stderr = await process.communicate()
+        return process.returncode == 0, stderr.decode("utf-8", errors="ignore") if stderr else ""
+    
     @classmethod
     async def download_file_async(cls, remote_relative_path: str, local_file_path: str) -> bool:
         """Download a file from rclone remote."""
         remote = cls._get_remote_base() + "/" + remote_relative_path.lstrip("/")
         return await cls.copy_to_async(remote, local_file_path)
     
+    @classmethod
+    async def download_many_async(cls, remote_relative_paths: List[str], local_dir: str) -> bool:
+        """Download many files into local_dir with a single rclone process.
+        
+        Remote paths keep their relative layout under local_dir.
+        """
+        os.makedirs(local_dir, exist_ok=True)
+        names = [path.lstrip("/") for path in remote_relative_paths]
+        if not names:
+            return True
+        
+        return await cls._copy_files_from_async(cls._get_remote_base(), os.path.abspath(local_dir), names)
+    
     @classmethod
     async def copy_to_async(cls, remote_path: str, local_file_path: str) -> bool:
         """Copy a file from remote to local using rclone copyto."""
         try:
-            args = [
-                "rclone", "copyto", remote_path, local_file_path,
-                "--retries=-1", "--retries-sleep=60s", "--low-level-retries=10",
-                "--bwlimit=off"
-            ]
+            local_file_path = os.path.abspath(local_file_path)
+            result = await cls._rc_copyfile_async(remote_path, local_file_path)
+            if result is None or not result[0]:
+                result = await cls._copyto_process_async(remote_path, local_file_path, [])
             
-            process = await asyncio.create_subprocess_exec(
-                *args,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            
-            _, stderr = await process.communicate()
-            
-            ok = process.returncode == 0 and os.path.exists(local_file_path)
-            if not ok and stderr:
-                console.print(f"[yellow]⚠️ rclone copyto falhou: {stderr.decode('utf-8', errors='ignore')}[/]")
+            ok, error = result
+            ok = ok and os.path.exists(local_file_path)
+            if not ok and error:
+                console.print(f"[yellow]⚠️ rclone copyto falhou: {error}[/]")
             
             return ok
         
@@ -152,10 +372,37 @@ class RcloneClient:
     async def upload_file_async(cls, local_file_path: str, remote_relative_path: str) -> bool:
         """Upload a single file to rclone remote."""
         try:
+            local_file_path = os.path.abspath(local_file_path)
             remote_path = cls._get_remote_base() + "/" + remote_relative_path.lstrip("/")
             
+            result = await cls._rc_copyfile_async(local_file_path, remote_path)
+            if result is None or not result[0]:
+                result = await cls._copyto_process_async(
+                    local_file_path, remote_path, ["--no-update-modtime"]
+                )
+            
+            ok, error = result
+            if not ok and error:
+                console.print(f"[yellow]⚠️ rclone upload file falhou: {error}[/]")
+            
+            return ok
+        
+        except Exception as ex:
+            console.print(f"[yellow]⚠️ Erro no rclone upload file: {ex}[/]")
+            return False
+    
+    @classmethod
+    async def _copy_files_from_async(cls, src: str, dst: str, names: List[str]) -> bool:
+        """Copy the listed files from src to dst in a single `rclone copy --files-from`."""
+        with tempfile.NamedTemporaryFile("w", encoding="utf-8", suffix=".txt", delete=False) as f:
+            f.write("\n".join(names) + "\n")
+            list_path = f.name
+        
+        try:
             args = [
-                "rclone", "copyto", local_file_path, remote_path,
+                "rclone", "copy", src, dst,
+                f"--files-from={list_path}", "--no-traverse",
+                f"--transfers={cls._get_transfers()}",
                 "--retries=-1", "--retries-sleep=60s", "--low-level-retries=10",
                 "--bwlimit=off", "--no-update-modtime"
             ]
@@ -170,10 +417,13 @@ class RcloneClient:
             
             ok = process.returncode == 0
             if not ok and stderr:
-                console.print(f"[yellow]⚠️ rclone upload file falhou: {stderr.decode('utf-8', errors='ignore')}[/]")
+                console.print(f"[yellow]⚠️ rclone copy --files-from falhou: {stderr.decode('utf-8', errors='ignore')}[/]")
             
             return ok
         
         except Exception as ex:
-            console.print(f"[yellow]⚠️ Erro no rclone upload file: {ex}[/]")
+            console.print(f"[yellow]⚠️ Erro no rclone copy --files-from: {ex}[/]")
             return False
+        
+        finally:
+            os.remove(list_path)
@@ -3,31 +3,61 @@
 OpenCNPJ ETL Processor - Main entry point
 """
 import asyncio
+import logging
 import sys
+from dataclasses import dataclass
 from typing import Optional
 
 import click
+from rich import traceback
 from rich.console import Console
 
+try:
+    import uvloop
+except ImportError:  # optional speedup; not available on Windows
+    uvloop = None
+
 from .config import AppConfig, set_config
 from .commands import PipelineCommand, SingleCommand, TestCommand, ZipCommand
+from .exporters.rclone_client import RcloneClient
 
 console = Console()
 
 
+@dataclass
+class CliState:
+    """State shared by the subcommands of one CLI invocation."""
+    config: AppConfig
+    runner: asyncio.Runner
+
+
+def _new_event_loop() -> asyncio.AbstractEventLoop:
+    """Create the event loop used by the CLI (uvloop when available)."""
+    if uvloop is not None:
+        return uvloop.new_event_loop()
+    return asyncio.new_event_loop()
+
+
 @click.group()
 @click.option(
     "--config",
     type=click.Path(exists=True),
     help="Path to configuration file (config.json)",
 )
-def cli(config: Optional[str]):
+@click.pass_context
+def cli(ctx: click.Context, config: Optional[str]):
     """OpenCNPJ ETL Processor - Process CNPJ data from Receita Federal."""
     console.print("[bold blue]🚀 OpenCNPJ ETL Processor[/]")
     
     # Load configuration
     app_config = AppConfig.load(config)
     set_config(app_config)
+    
+    runner = asyncio.Runner(loop_factory=_new_event_loop)
+    # Close callbacks run last-registered first: rclone is shut down on the loop before it closes
+    ctx.call_on_close(runner.close)
+    ctx.call_on_close(lambda: runner.run(RcloneClient.close_async()))
+    ctx.obj = CliState(config=app_config, runner=runner)
 
 
 @cli.command()
@@ -37,11 +67,12 @@ def cli(config: Optional[str]):
     required=True,
     help="CNPJ (14 dígitos)",
 )
-def single(cnpj: str):
+@click.pass_obj
+def single(state: CliState, cnpj: str):
     """Process a specific CNPJ."""
     try:
-        command = SingleCommand(cnpj)
-        exit_code = asyncio.run(command.execute_async())
+        command = SingleCommand(cnpj, config=state.config)
+        exit_code = state.runner.run(command.execute_async())
         sys.exit(exit_code)
     except ValueError as ex:
         console.print(f"[red]❌ {ex}[/]")
@@ -49,18 +80,20 @@ def single(cnpj: str):
 
 
 @cli.command()
-def test():
+@click.pass_obj
+def test(state: CliState):
     """Test data integrity with sampling."""
     command = TestCommand()
-    exit_code = asyncio.run(command.execute_async())
+    exit_code = state.runner.run(command.execute_async())
     sys.exit(exit_code)
 
 
 @cli.command()
-def zip():
+@click.pass_obj
+def zip(state: CliState):
     """Generate consolidated ZIP file."""
     command = ZipCommand()
-    exit_code = asyncio.run(command.execute_async())
+    exit_code = state.runner.run(command.execute_async())
     sys.exit(exit_code)
 
 
@@ -70,15 +103,19 @@ def zip():
     "-m",
     help="Month (YYYY-MM). Default: previous month",
 )
-def pipeline(month: Optional[str]):
+@click.pass_obj
+def pipeline(state: CliState, month: Optional[str]):
     """Run full pipeline (download → ingest → upload → test → zip)."""
-    command = PipelineCommand(month)
-    exit_code = asyncio.run(command.execute_async())
+    command = PipelineCommand(month, config=state.config)
+    exit_code = state.runner.run(command.execute_async())
     sys.exit(exit_code)
 
 
 def main():
     """Main entry point."""
+    # Rich tracebacks only for errors that escape the CLI; commands log theirs as plain text
+    traceback.install(show_locals=False)
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s %(name)s: %(message)s")
     cli()
 
 
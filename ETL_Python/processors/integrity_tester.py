@@ -1,3 +1,4 @@
+import asyncio
 import os
 import tempfile
 from pathlib import Path
@@ -7,43 +8,63 @@ import xxhash
 from rich.console import Console
 from rich.progress import Progress
 
-from ..config import get_config
 from ..exporters.rclone_client import RcloneClient
 from ..utils.json_cleanup_utils import JsonCleanupUtils
 from .parquet_ingestor import ParquetIngestor
 
 console = Console()
 
+# (cnpj, local_hash, remote_hash, equal, note)
+CheckResult = Tuple[str, Optional[int], Optional[int], bool, Optional[str]]
+
 
 class IntegrityTester:
     """Test integrity of exported JSON data."""
     
+    # Upper bound on CNPJs exported/downloaded at the same time
+    MAX_CONCURRENT_CHECKS = 8
+    HASH_CHUNK_SIZE = 64 * 1024
+    
     @staticmethod
-    def _compute_hash(json_str: str) -> str:
-        """Compute xxHash3 hash of JSON string."""
-        h = xxhash.xxh3_64()
-        h.update(json_str.encode("utf-8"))
-        return h.hexdigest()
+    def _compute_hash(json_data: bytes) -> int:
+        """Compute xxHash3 (64-bit) of JSON bytes."""
+        return xxhash.xxh3_64_intdigest(json_data)
+    
+    @classmethod
+    def _hash_file(cls, path: str) -> int:
+        """Compute xxHash3 (64-bit) of a file, streamed in fixed-size chunks.
+        
+        Reading into one reusable buffer is cheaper than mapping the file for
+        the few-KB JSONs compared here.
+        """
+        hasher = xxhash.xxh3_64()
+        buffer = bytearray(cls.HASH_CHUNK_SIZE)
+        view = memoryview(buffer)
+        
+        with open(path, "rb", buffering=0) as f:
+            while read := f.readinto(buffer):
+                hasher.update(view[:read])
+        
+        return hasher.intdigest()
+    
+    @classmethod
+    def _hash_canonical_file(cls, path: str) -> int:
+        """Compute xxHash3 (64-bit) of a file's cleaned, compact JSON."""
+        with open(path, "rb") as f:
+            return cls._compute_hash(JsonCleanupUtils.clean_json_bytes(f.read()))
     
     async def run_async(self, total: int = 10) -> None:
         """Run integrity test on sample CNPJs."""
-        import duckdb
-        
-        config = get_config()
-        
-        # Initialize DuckDB connection
-        data_source = ":memory:" if config.duckdb.use_in_memory else "./cnpj.duckdb"
-        conn = duckdb.connect(data_source)
-        
-        # Load Parquet views
-        await self._load_parquet_views_async(conn)
+        # One ingestor (and DuckDB connection) serves sampling and every export
+        ingestor = ParquetIngestor()
+        conn = await ingestor.get_connection_async()
         
         # Pick sample CNPJs
         sample = await self._pick_sample_async(conn, total)
         
         if not sample:
             console.print("[red]❌ Não foi possível selecionar CNPJs para o teste[/]")
-            conn.close()
+            ingestor.dispose()
             return
         
         # Create temp directories
@@ -53,63 +74,41 @@ class IntegrityTester:
         os.makedirs(local_json_dir, exist_ok=True)
         os.makedirs(remote_json_dir, exist_ok=True)
         
-        ingestor = ParquetIngestor()
-        results = []
+        results: List[CheckResult] = []
         
         try:
             with Progress() as progress:
                 task = progress.add_task("[green]Comparando hashes[/]", total=len(sample))
                 
-                for cnpj in sample:
-                    progress.update(task, description=f"[cyan]Processando {cnpj}[/]")
-                    
-                    note: Optional[str] = None
-                    local_path = os.path.join(local_json_dir, f"{cnpj}.json")
-                    remote_path = os.path.join(remote_json_dir, f"{cnpj}.json")
-                    
-                    try:
-                        # Generate local JSON
-                        await ingestor.export_single_cnpj_async(cnpj, local_json_dir)
-                        
-                        if not os.path.exists(local_path):
-                            raise RuntimeError("JSON local não gerado")
-                        
-                        with open(local_path, "r", encoding="utf-8") as f:
-                            local_json = f.read()
-                        
-                        local_json = JsonCleanupUtils.clean_json_spaces(local_json)
-                        local_hash = self._compute_hash(local_json)
-                        
-                        # Download from storage
-                        ok = await RcloneClient.download_file_async(f"{cnpj}.json", remote_path)
-                        if not ok or not os.path.exists(remote_path):
-                            raise RuntimeError("Download via rclone falhou ou arquivo não existe no Storage")
-                        
-                        with open(remote_path, "r", encoding="utf-8") as f:
-                            remote_json = f.read()
-                        
-                        remote_json = JsonCleanupUtils.clean_json_spaces(remote_json)
-                        remote_hash = self._compute_hash(remote_json)
-                        
-                        equal = local_hash.lower() == remote_hash.lower()
-                        results.append((cnpj, local_hash, remote_hash, equal, note))
-                    
-                    except Exception as ex:
-                        note = str(ex)
-                        results.append((cnpj, "-", "-", False, note))
-                    
-                    progress.advance(task)
+                # Fetch every remote file in one rclone run while local exports proceed
+                remote_ready = asyncio.create_task(
+                    RcloneClient.download_many_async([f"{cnpj}.json" for cnpj in sample], remote_json_dir)
+                )
+                sem = asyncio.Semaphore(self.MAX_CONCURRENT_CHECKS)
+                
+                async def check(cnpj: str) -> CheckResult:
+                    async with sem:
+                        progress.update(task, description=f"[cyan]Processando {cnpj}[/]")
+                        result = await self._check_cnpj_async(
+                            ingestor, cnpj, local_json_dir, remote_json_dir, remote_ready
+                        )
+                        progress.advance(task)
+                        return result
+                
+                try:
+                    results = await asyncio.gather(*(check(cnpj) for cnpj in sample))
+                finally:
+                    remote_ready.cancel()
         
         finally:
             ingestor.dispose()
-            conn.close()
         
         # Report
         success_count = sum(1 for r in results if r[3])
         
         for cnpj, local_hash, remote_hash, ok, note in results:
             if ok:
-                console.print(f"[green]✓ {cnpj}[/] [grey](hash {local_hash})[/]")
+                console.print(f"[green]✓ {cnpj}[/] [grey](hash {local_hash:016x})[/]")
             else:
                 error_msg = note or "Hashes divergentes ou indisponíveis"
                 console.print(f"[red]✗ {cnpj}[/] {error_msg}")
@@ -123,78 +122,86 @@ class IntegrityTester:
         import shutil
         shutil.rmtree(temp_root, ignore_errors=True)
     
-    async def _load_parquet_views_async(self, conn) -> None:
-        """Load Parquet files as views in DuckDB."""
-        config = get_config()
-        base_dir = config.paths.parquet_dir
-        
-        views = {
-            "empresa": "empresa/**/*.parquet",
-            "estabelecimento": "estabelecimento/**/*.parquet",
-            "socio": "socio/**/*.parquet",
-            "simples": "simples/**/*.parquet",
-            "cnae": "cnae.parquet",
-            "motivo": "motivo.parquet",
-            "municipio": "municipio.parquet",
-            "natureza": "natureza.parquet",
-            "pais": "pais.parquet",
-            "qualificacao": "qualificacao.parquet"
-        }
-        
-        for name, pattern in views.items():
-            full_path = os.path.join(base_dir, pattern)
-            sql = f"CREATE OR REPLACE VIEW {name} AS SELECT * FROM read_parquet('{full_path}')"
-            conn.execute(sql)
+    async def _check_cnpj_async(
+        self,
+        ingestor: ParquetIngestor,
+        cnpj: str,
+        local_json_dir: str,
+        remote_json_dir: str,
+        remote_ready: "asyncio.Future[bool]"
+    ) -> CheckResult:
+        """Export one CNPJ locally, download it from storage and compare hashes."""
+        local_path = os.path.join(local_json_dir, f"{cnpj}.json")
+        remote_path = os.path.join(remote_json_dir, f"{cnpj}.json")
+        
+        try:
+            # Generate local JSON
+            await ingestor.export_single_cnpj_async(cnpj, local_json_dir)
+            
+            if not os.path.exists(local_path):
+                raise RuntimeError("JSON local não gerado")
+            
+            local_hash = self._hash_file(local_path)
+            
+            # Wait for the batch download; retry missing files one by one
+            await remote_ready
+            if not os.path.exists(remote_path):
+                await RcloneClient.download_file_async(f"{cnpj}.json", remote_path)
+            if not os.path.exists(remote_path):
+                raise RuntimeError("Download via rclone falhou ou arquivo não existe no Storage")
+            
+            remote_hash = self._hash_file(remote_path)
+            
+            # Both sides are written as cleaned compact JSON; only
+            # canonicalize when the raw bytes differ
+            if local_hash != remote_hash:
+                local_hash = self._hash_canonical_file(local_path)
+                remote_hash = self._hash_canonical_file(remote_path)
+            
+            return cnpj, local_hash, remote_hash, local_hash == remote_hash, None
+        
+        except Exception as ex:
+            return cnpj, None, None, False, str(ex)
     
     async def _pick_sample_async(self, conn, total: int) -> List[str]:
         """Pick a sample of CNPJs for testing."""
-        sample_set = set()
-        
-        # At least 1 with SIMPLES
-        try:
-            result = conn.execute("""
-                SELECT e.cnpj_basico || e.cnpj_ordem || e.cnpj_dv AS cnpj
-                FROM estabelecimento e
-                INNER JOIN simples s ON e.cnpj_basico = s.cnpj_basico
-                ORDER BY random() LIMIT 1
-            """).fetchone()
-            if result and result[0]:
-                sample_set.add(result[0])
-        except Exception:
-            pass
+        cnpj_expr = "e.cnpj_basico || e.cnpj_ordem || e.cnpj_dv"
+        random_sql = f"""
+            SELECT {cnpj_expr} AS cnpj, 2 AS priority
+            FROM estabelecimento e
+            USING SAMPLE reservoir({total} ROWS)
+        """
+        # At least 1 with SIMPLES and 1 with SOCIO, then fill the rest with
+        # random CNPJs; reservoir sampling avoids sorting the whole table
+        fused_sql = f"""
+            (SELECT {cnpj_expr} AS cnpj, 1 AS priority
+             FROM estabelecimento e
+             INNER JOIN simples s ON e.cnpj_basico = s.cnpj_basico
+             USING SAMPLE reservoir(1 ROWS))
+            UNION ALL
+            (SELECT {cnpj_expr} AS cnpj, 1 AS priority
+             FROM estabelecimento e
+             INNER JOIN socio so ON e.cnpj_basico = so.cnpj_basico
+             USING SAMPLE reservoir(1 ROWS))
+            UNION ALL
+            ({random_sql})
+        """
+        
+        # Deduplicate in DuckDB, keeping the SIMPLES/SOCIO picks within the limit
+        distinct_sql = """
+            SELECT cnpj FROM ({}) picks
+            WHERE cnpj IS NOT NULL
+            GROUP BY cnpj
+            ORDER BY min(priority)
+            LIMIT {}
+        """
         
-        # At least 1 with SOCIO
         try:
-            result = conn.execute("""
-                SELECT e.cnpj_basico || e.cnpj_ordem || e.cnpj_dv AS cnpj
-                FROM estabelecimento e
-                INNER JOIN socio so ON e.cnpj_basico = so.cnpj_basico
-                ORDER BY random() LIMIT 1
-            """).fetchone()
-            if result and result[0]:
-                sample_set.add(result[0])
+            rows = conn.execute(distinct_sql.format(fused_sql, total)).fetchall()
         except Exception:
-            pass
-        
-        # Fill the rest with random CNPJs
-        while len(sample_set) < total:
-            remaining = total - len(sample_set)
             try:
-                results = conn.execute(f"""
-                    SELECT DISTINCT e.cnpj_basico || e.cnpj_ordem || e.cnpj_dv AS cnpj
-                    FROM estabelecimento e
-                    ORDER BY random() LIMIT {max(remaining * 2, 8)}
-                """).fetchall()
-                
-                for row in results:
-                    if row and row[0]:
-                        sample_set.add(row[0])
-                        if len(sample_set) >= total:
-                            break
-                
-                if not results:
-                    break
+                rows = conn.execute(distinct_sql.format(random_sql, total)).fetchall()
             except Exception:
-                break
+                return []
         
-        return list(sample_set)[:total]
+        return [row[0] for row in rows]
@@ -23,6 +23,24 @@ def test_is_valid_format():
     assert not CnpjUtils.is_valid_format("123")
     assert not CnpjUtils.is_valid_format("11111111111111")  # Repeated sequence
     assert not CnpjUtils.is_valid_format("AAAAAAAAAAAAAA")  # Repeated sequence
+    assert not CnpjUtils.is_valid_format("12345678ß0195")  # Uppercases to 14 chars
+    assert not CnpjUtils.is_valid_format("ﬃ12345670001")
+    assert not CnpjUtils.is_valid_format("１２３４５６７８０００１９０")  # Fullwidth digits
+
+
+def test_is_valid():
+    """Test CNPJ check digit validation."""
+    assert CnpjUtils.is_valid("12.345.678/0001-95")
+    assert CnpjUtils.is_valid("00000000000191")
+    assert CnpjUtils.is_valid("12.ABC.345/01DE-35")  # Alphanumeric
+    assert CnpjUtils.is_valid("12abc34501de35")
+    
+    assert not CnpjUtils.is_valid("12345678000190")  # Wrong check digits
+    assert not CnpjUtils.is_valid("12ABC34501DE36")
+    assert not CnpjUtils.is_valid("00000000000000")  # Repeated sequence
+    assert not CnpjUtils.is_valid("123")
+    assert not CnpjUtils.is_valid(None)
+    assert not CnpjUtils.is_valid("12345678ß0195")
 
 
 def test_parse_cnpj():
@@ -54,6 +54,61 @@ def test_load_config_nonexistent_file():
     assert config.paths.data_dir == "./extracted_data"
 
 
+def test_load_config_maps_all_sections():
+    """Test CamelCase keys map to every section and unknown keys are ignored."""
+    with tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False) as f:
+        config_data = {
+            "Paths": {"HashCacheDir": "./test_hashes", "Unknown": "ignored"},
+            "Rclone": {"MaxConcurrentUploads": 2, "S3Tuning": True},
+            "DuckDb": {"UseInMemory": False, "MemoryLimit": "1GB"},
+            "Ndjson": {"MaxParallelProcessing": 3},
+            "Downloader": {"ParallelDownloads": 9}
+        }
+        json.dump(config_data, f)
+        temp_path = f.name
+    
+    try:
+        config = AppConfig.load(temp_path)
+        assert config.paths.hash_cache_dir == "./test_hashes"
+        assert config.paths.data_dir == "./extracted_data"
+        assert config.rclone.max_concurrent_uploads == 2
+        assert config.rclone.s3_tuning is True
+        assert config.duckdb.use_in_memory is False
+        assert config.duckdb.memory_limit == "1GB"
+        assert config.ndjson.max_parallel_processing == 3
+        assert config.downloader.parallel_downloads == 9
+    finally:
+        os.unlink(temp_path)
+
+
+def test_load_config_mistyped_value_returns_defaults():
+    """Test a wrongly-typed value falls back to the default configuration."""
+    for config_data in (
+        {"Rclone": {"RemoteBase": "test:bucket", "Transfers": "50"}},
+        {"Rclone": {"RemoteBase": "test:bucket", "S3Tuning": 1}},
+        {"Rclone": ["test:bucket"]},
+    ):
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False) as f:
+            json.dump(config_data, f)
+            temp_path = f.name
+        
+        try:
+            config = AppConfig.load(temp_path)
+            assert config.rclone == RcloneSettings()
+        finally:
+            os.unlink(temp_path)
+
+
+def test_config_is_frozen():
+    """Test configuration sections are immutable."""
+    import dataclasses
+    import pytest
+    
+    settings = RcloneSettings()
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        settings.transfers = 1
+
+
 if __name__ == "__main__":
     import pytest
     pytest.main([__file__, "-v"])
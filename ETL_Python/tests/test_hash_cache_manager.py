@@ -0,0 +1,111 @@
+"""Tests for hash_cache_manager module."""
+import sqlite3
+import zipfile
+
+from ETL_Python.exporters.rclone_client import RcloneClient
+from ETL_Python.utils.hash_cache_manager import HashCacheManager, ProcessedItem
+
+
+def test_hash_to_db_fits_signed_int64():
+    """Test unsigned 64-bit hashes map into SQLite's signed INTEGER range."""
+    assert HashCacheManager._hash_to_db(0) == 0
+    assert HashCacheManager._hash_to_db((1 << 63) - 1) == (1 << 63) - 1
+    assert HashCacheManager._hash_to_db(1 << 63) == -(1 << 63)
+    assert HashCacheManager._hash_to_db((1 << 64) - 1) == -1
+
+
+def test_migrate_hex_hashes():
+    """Test legacy TEXT hex hashes are converted to INTEGER."""
+    connection = sqlite3.connect(":memory:")
+    connection.execute("""
+        CREATE TABLE hashes (
+            cnpj TEXT PRIMARY KEY NOT NULL,
+            hash TEXT NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    connection.executemany(
+        "INSERT INTO hashes (cnpj, hash) VALUES (?, ?)",
+        [("11111111000111", "00000000000000ff"), ("22222222000122", "FFFFFFFFFFFFFFFF"), ("33333333000133", "invalid")]
+    )
+
+    assert HashCacheManager._migrate_hex_hashes(connection)
+
+    rows = dict(connection.execute("SELECT cnpj, hash FROM hashes"))
+    assert rows == {"11111111000111": 255, "22222222000122": -1}
+    assert HashCacheManager._hash_to_db(0xFFFFFFFFFFFFFFFF) == rows["22222222000122"]
+
+    # Already migrated: no-op
+    assert not HashCacheManager._migrate_hex_hashes(connection)
+
+
+async def test_get_items_to_process_async(monkeypatch):
+    """Test only new and changed items are returned."""
+    connection = sqlite3.connect(":memory:", check_same_thread=False)
+    connection.execute("CREATE TABLE hashes (cnpj TEXT PRIMARY KEY NOT NULL, hash INTEGER NOT NULL)")
+    connection.executemany(
+        "INSERT INTO hashes (cnpj, hash) VALUES (?, ?)",
+        [("12000000000100", 1), ("12000000000200", HashCacheManager._hash_to_db(1 << 63)), ("13000000000100", 3)]
+    )
+    monkeypatch.setattr(HashCacheManager, "_connection", connection)
+    monkeypatch.setattr(HashCacheManager, "_initialized", True)
+    
+    items = [
+        ProcessedItem("12000000000100", b"{}", 1),
+        ProcessedItem("12000000000200", b"{}", 2),
+        ProcessedItem("12000000000300", b"{}", 3),
+        ProcessedItem("12000000000400", b"{}", 1 << 63),
+    ]
+    
+    result = [item.cnpj async for item in HashCacheManager.get_items_to_process_async(items)]
+    
+    assert result == ["12000000000200", "12000000000300", "12000000000400"]
+
+
+async def test_add_batch_async_commits(monkeypatch, tmp_path):
+    """Test batch inserts are committed, not left in an open transaction."""
+    db_path = str(tmp_path / "hashes.db")
+    connection = sqlite3.connect(db_path, check_same_thread=False)
+    connection.execute("CREATE TABLE hashes (cnpj TEXT PRIMARY KEY NOT NULL, hash INTEGER NOT NULL)")
+    monkeypatch.setattr(HashCacheManager, "_connection", connection)
+    
+    await HashCacheManager.add_batch_async([
+        ProcessedItem("12000000000100", b"{}", 1),
+        ProcessedItem("12000000000200", b"{}", (1 << 64) - 1),
+    ])
+    
+    assert not connection.in_transaction
+    
+    rows = dict(sqlite3.connect(db_path).execute("SELECT cnpj, hash FROM hashes"))
+    assert rows == {"12000000000100": 1, "12000000000200": -1}
+
+
+async def test_upload_database_keeps_connection_open(monkeypatch, tmp_path):
+    """Test the uploaded snapshot has committed rows and the cache stays usable."""
+    db_path = str(tmp_path / "hashes.db")
+    connection = sqlite3.connect(db_path, check_same_thread=False)
+    connection.execute("PRAGMA journal_mode = WAL")
+    connection.execute("CREATE TABLE hashes (cnpj TEXT PRIMARY KEY NOT NULL, hash INTEGER NOT NULL)")
+    monkeypatch.setattr(HashCacheManager, "_connection", connection)
+    monkeypatch.setattr(HashCacheManager, "_db_path", db_path)
+    monkeypatch.setattr(HashCacheManager, "_initialized", True)
+    
+    uploaded = {}
+    
+    async def fake_upload(local_path, remote_name):
+        with zipfile.ZipFile(local_path) as archive:
+            uploaded[remote_name] = archive.read("hashes.db")
+        return True
+    
+    monkeypatch.setattr(RcloneClient, "upload_file_async", staticmethod(fake_upload))
+    
+    await HashCacheManager.add_batch_async([ProcessedItem("12000000000100", b"{}", 7)])
+    assert await HashCacheManager.upload_database_async()
+    
+    snapshot_path = tmp_path / "snapshot.db"
+    snapshot_path.write_bytes(uploaded["hashes.zip"])
+    assert sqlite3.connect(snapshot_path).execute("SELECT cnpj, hash FROM hashes").fetchall() == [("12000000000100", 7)]
+    
+    # Still open: later batches go to the same connection
+    await HashCacheManager.add_batch_async([ProcessedItem("12000000000200", b"{}", 8)])
+    assert HashCacheManager._connection is connection
@@ -46,6 +46,31 @@ def test_clean_json_spaces_preserves_numbers():
     assert data["value"] == 3.14
 
 
+def test_clean_json_bytes():
+    """Test that cleaned JSON bytes are compact and match clean_json_spaces."""
+    input_json = json.dumps({"name": "  Test   Name  ", "items": ["  a  b "]}, ensure_ascii=False)
+    
+    output = JsonCleanupUtils.clean_json_bytes(input_json.encode("utf-8"))
+    
+    assert output == b'{"name":"Test Name","items":["a b"]}'
+    assert output.decode("utf-8") == JsonCleanupUtils.clean_json_spaces(input_json)
+
+
+
+def test_clean_value_in_place():
+    """Test that parsed data is cleaned in place, including tabs and NBSP."""
+    clean = {"name": "Company", "items": ["a b"]}
+    clean_item = clean["items"][0]
+    data = {"name": "\tTest\u00a0 Name ", "nested": [{"value": "x\n\ny"}, 42, None], "clean": clean}
+    
+    result = JsonCleanupUtils.clean_value(data)
+    
+    assert result is data
+    assert data == {"name": "Test Name", "nested": [{"value": "x y"}, 42, None], "clean": clean}
+    assert data["clean"]["items"][0] is clean_item
+    assert JsonCleanupUtils.clean_value("  top  level ") == "top level"
+
+
 if __name__ == "__main__":
     import pytest
     pytest.main([__file__, "-v"])
@@ -0,0 +1,31 @@
+"""Tests for json_io module."""
+import json
+
+from ETL_Python.utils import json_io
+
+
+def test_dumps_is_compact_utf8():
+    """Test dumps produces compact JSON bytes keeping non-ASCII characters."""
+    output = json_io.dumps({"nome": "São Paulo", "itens": [1, 2]})
+    assert isinstance(output, bytes)
+    assert output == '{"nome":"São Paulo","itens":[1,2]}'.encode("utf-8")
+
+
+def test_loads_accepts_bytes_and_str():
+    """Test loads parses both bytes and str input."""
+    data = {"cnpj": "12345678000190", "qsa": [{"nome": "Fulano"}]}
+    assert json_io.loads(json.dumps(data)) == data
+    assert json_io.loads(json.dumps(data).encode("utf-8")) == data
+
+
+def test_loads_invalid_raises_json_decode_error():
+    """Test invalid input raises a json.JSONDecodeError subclass."""
+    import pytest
+    
+    with pytest.raises(json.JSONDecodeError):
+        json_io.loads(b"{invalid")
+
+
+if __name__ == "__main__":
+    import pytest
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,32 @@
+"""Tests for rclone_client module."""
+import asyncio
+
+from ETL_Python.exporters.rclone_client import RcloneClient
+
+
+async def test_download_many_async_uses_one_files_from_process(monkeypatch, tmp_path):
+    """Test many downloads run as one `rclone copy --files-from` with every name listed."""
+    calls = []
+    
+    class FakeProcess:
+        returncode = 0
+        
+        async def communicate(self):
+            return b"", b""
+    
+    async def fake_exec(*args, **kwargs):
+        list_path = next(arg for arg in args if arg.startswith("--files-from=")).split("=", 1)[1]
+        with open(list_path, encoding="utf-8") as f:
+            calls.append((args, f.read().splitlines()))
+        return FakeProcess()
+    
+    monkeypatch.setattr(asyncio, "create_subprocess_exec", fake_exec)
+    monkeypatch.setattr(RcloneClient, "_get_remote_base", classmethod(lambda cls: "remote:bucket"))
+    monkeypatch.setattr(RcloneClient, "_get_transfers", classmethod(lambda cls: 4))
+    
+    assert await RcloneClient.download_many_async(["/a.json", "b.json"], str(tmp_path))
+    
+    assert len(calls) == 1
+    args, names = calls[0]
+    assert args[:4] == ("rclone", "copy", "remote:bucket", str(tmp_path))
+    assert names == ["a.json", "b.json"]
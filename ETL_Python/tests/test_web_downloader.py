@@ -0,0 +1,17 @@
+"""Tests for web_downloader module."""
+from ETL_Python.downloaders.web_downloader import _parse_zip_hrefs
+
+
+def test_parse_zip_hrefs():
+    """Test ZIP links are found with any quoting and extension case."""
+    page = (
+        '<a href="Empresas0.zip">Empresas0.zip</a>'
+        "<a href='Socios0.ZIP'>Socios0</a>"
+        '<A HREF = " Cnaes.zip ">Cnaes</A>'
+        '<a href=Paises.zip>Paises</a>'
+        '<a href="a&amp;b.zip">a</a>'
+        '<a href="LEIAME.pdf">LEIAME</a>'
+        '<a href="?C=N;O=D">Name</a>'
+    )
+    
+    assert _parse_zip_hrefs(page) == ["Empresas0.zip", "Socios0.ZIP", "Cnaes.zip", "Paises.zip", "a&b.zip"]
@@ -1,44 +1,75 @@
 import re
+from operator import mul
 from typing import Optional, Tuple
 
 
 class CnpjUtils:
     """Utilities for CNPJ validation and normalization (including alphanumeric)."""
     
-    MASK_CHARACTERS = re.compile(r"[./-]")
-    INVALID_CHARACTERS = re.compile(r"[^A-Z\d./-]", re.IGNORECASE)
-    BASE_CNPJ_PATTERN = re.compile(r"^[A-Z\d]{12}$")
-    FULL_CNPJ_PATTERN = re.compile(r"^[A-Z\d]{12}\d{2}$")
+    MASK_TRANSLATION = str.maketrans("", "", "./-")
+    BASE_CNPJ_PATTERN = re.compile(r"[A-Z0-9]{12}")
+    FULL_CNPJ_PATTERN = re.compile(r"[A-Z0-9]{12}[0-9]{2}")
     BASE_LENGTH = 12
+    # Mod-11 weights for the second check digit; the first uses the last 12.
+    # Alphanumeric CNPJs value each character as its ASCII code minus 48
+    # (0-9 as is, A=17 ... Z=42), so sums run over the raw bytes and the
+    # offset is taken out once
+    CHECK_DIGIT_WEIGHTS = (6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2)
+    CHECK_DIGIT_OFFSETS = (48 * sum(CHECK_DIGIT_WEIGHTS[1:]), 48 * sum(CHECK_DIGIT_WEIGHTS))
     
     @staticmethod
     def remove_mask(cnpj: Optional[str]) -> str:
         """Remove mask from CNPJ (dots, slashes, hyphens) and convert to uppercase."""
-        if not cnpj or not cnpj.strip():
+        if not cnpj or cnpj.isspace():
             return ""
-        return CnpjUtils.MASK_CHARACTERS.sub("", cnpj).upper()
+        return cnpj.translate(CnpjUtils.MASK_TRANSLATION).upper()
     
     @staticmethod
     def is_valid_format(cnpj: Optional[str]) -> bool:
         """Validate if CNPJ has valid format (alphanumeric: 12 alphanumeric chars + 2 digits)."""
-        if not cnpj or not cnpj.strip():
+        # Checked before unmasking: uppercasing can change the length of
+        # non-ASCII text ("ß" -> "SS")
+        if not cnpj or not cnpj.isascii():
             return False
         
-        if CnpjUtils.INVALID_CHARACTERS.search(cnpj):
+        return CnpjUtils._has_valid_format(CnpjUtils.remove_mask(cnpj))
+    
+    @staticmethod
+    def is_valid(cnpj: Optional[str]) -> bool:
+        """Validate CNPJ format and its two mod-11 check digits."""
+        if not cnpj or not cnpj.isascii():
             return False
         
         raw = CnpjUtils.remove_mask(cnpj)
-        
-        if len(raw) != 14:
+        if not CnpjUtils._has_valid_format(raw):
             return False
         
-        if not CnpjUtils.FULL_CNPJ_PATTERN.match(raw):
-            return False
+        # The format check guarantees ASCII
+        data = raw.encode("ascii")
+        weights = CnpjUtils.CHECK_DIGIT_WEIGHTS
+        first_offset, second_offset = CnpjUtils.CHECK_DIGIT_OFFSETS
         
-        if CnpjUtils._is_repeated_sequence(raw):
-            return False
+        first = CnpjUtils._check_digit(sum(map(mul, data[:12], weights[1:])) - first_offset)
+        second = CnpjUtils._check_digit(sum(map(mul, data[:13], weights)) - second_offset)
         
-        return True
+        return data[12] - 48 == first and data[13] - 48 == second
+    
+    @staticmethod
+    def _has_valid_format(raw: str) -> bool:
+        """Check an unmasked CNPJ's shape (12 alphanumeric chars + 2 digits, not repeated)."""
+        # Whitespace and any other stray character survive unmasking, so the
+        # length check plus one fullmatch rejects them
+        return (
+            len(raw) == 14
+            and CnpjUtils.FULL_CNPJ_PATTERN.fullmatch(raw) is not None
+            and not CnpjUtils._is_repeated_sequence(raw)
+        )
+    
+    @staticmethod
+    def _check_digit(weighted_sum: int) -> int:
+        """Mod-11 check digit for a weighted sum."""
+        remainder = weighted_sum % 11
+        return 0 if remainder < 2 else 11 - remainder
     
     @staticmethod
     def _is_repeated_sequence(cnpj: str) -> bool:
@@ -46,8 +77,7 @@ class CnpjUtils:
         if not cnpj or len(cnpj) < 2:
             return False
         
-        first_char = cnpj[0]
-        return all(c == first_char for c in cnpj)
+        return cnpj == cnpj[0] * len(cnpj)
     
     @staticmethod
     def parse_cnpj(cnpj: str) -> Tuple[str, str, str]:
@@ -55,13 +85,13 @@ class CnpjUtils:
         Extract CNPJ parts: basico (8), ordem (4), dv (2).
         Removes mask automatically before extracting.
         """
-        raw = CnpjUtils.remove_mask(cnpj)
+        # Already unmasked (the usual case downstream of ingestion): only uppercase
+        if cnpj and len(cnpj) == 14 and cnpj.isascii() and cnpj.isalnum():
+            raw = cnpj.upper()
+        else:
+            raw = CnpjUtils.remove_mask(cnpj)
         
         if len(raw) != 14:
             raise ValueError(f"CNPJ must have 14 characters after removing mask. Received: {len(raw)}")
         
-        basico = raw[:8]
-        ordem = raw[8:12]
-        dv = raw[12:14]
-        
-        return basico, ordem, dv
+        return raw[:8], raw[8:12], raw[12:]
@@ -1,6 +1,7 @@
 import json
-import re
-from typing import Any, Dict
+from typing import Any, Dict, Union
+
+from . import json_io
 
 
 class JsonCleanupUtils:
@@ -11,29 +12,66 @@ class JsonCleanupUtils:
         """Normalize multiple spaces in a string."""
         if not input_str:
             return ""
-        return re.sub(r"\s+", " ", input_str.strip())
+        # str.split() splits on the same characters as re's \s, in C
+        return " ".join(input_str.split())
     
     @staticmethod
     def clean_json_spaces(json_content: str) -> str:
         """Clean excessive spaces in JSON text fields."""
         try:
-            data = json.loads(json_content)
-            cleaned = JsonCleanupUtils._clean_element(data)
-            return json.dumps(cleaned, ensure_ascii=False, separators=(',', ':'))
+            # json_io uses orjson when installed; both backends emit compact UTF-8
+            return JsonCleanupUtils.clean_json_bytes(json_content).decode("utf-8")
         except (json.JSONDecodeError, ValueError, TypeError):
             return json_content
     
+    @staticmethod
+    def clean_json_bytes(json_content: Union[bytes, str]) -> bytes:
+        """Clean excessive spaces in JSON text fields and return compact UTF-8 bytes.
+        
+        Raises json.JSONDecodeError on invalid input.
+        """
+        return json_io.dumps(JsonCleanupUtils.clean_value(json_io.loads(json_content)))
+    
+    @staticmethod
+    def clean_value(data: Any) -> Any:
+        """Clean excessive spaces in the strings of already-parsed JSON data.
+        
+        Containers are cleaned in place and returned.
+        """
+        return JsonCleanupUtils._clean_element(data)
+    
     @staticmethod
     def _clean_element(element: Any) -> Any:
-        """Recursively clean spaces in JSON elements."""
-        if isinstance(element, dict):
-            return {
-                key: JsonCleanupUtils._clean_element(value)
-                for key, value in element.items()
-            }
-        elif isinstance(element, list):
-            return [JsonCleanupUtils._clean_element(item) for item in element]
-        elif isinstance(element, str):
-            return JsonCleanupUtils.normalize_spaces(element)
-        else:
+        """Clean spaces in the strings of a JSON value, mutating containers in place.
+        
+        Uses an explicit stack instead of recursion, and only replaces strings
+        whose text actually changes.
+        """
+        if isinstance(element, str):
+            return JsonCleanupUtils._clean_string(element)
+        if not isinstance(element, (dict, list)):
             return element
+        
+        clean_string = JsonCleanupUtils._clean_string
+        stack = [element]
+        while stack:
+            container = stack.pop()
+            items = container.items() if isinstance(container, dict) else enumerate(container)
+            for key, value in items:
+                if isinstance(value, str):
+                    cleaned = clean_string(value)
+                    if cleaned is not value:
+                        container[key] = cleaned
+                elif isinstance(value, (dict, list)):
+                    stack.append(value)
+        
+        return element
+    
+    @staticmethod
+    def _clean_string(value: str) -> str:
+        """Normalize spaces in a string, returning it unchanged when already clean."""
+        # Every whitespace character except " " is non-printable, so this
+        # guard proves normalize_spaces would be a no-op
+        if value.isprintable() and "  " not in value and value[:1] != " " and value[-1:] != " ":
+            return value
+        return JsonCleanupUtils.normalize_spaces(value)